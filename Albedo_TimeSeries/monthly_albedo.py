@@ -11,13 +11,15 @@
 """
 
 import pandas as pd
+import pyarrow.csv as pacsv
 import os
+import glob
+from functools import lru_cache
 
 def calculate_monthly_avg_albedo(folder_path):
     """
-    Reads CSV files containing surface albedo data for multiple years, calculates the average
-    surface albedo for each month for each year, and then calculates the average monthly albedo
-    across all years.
+    Reads CSV files containing surface albedo data for multiple years and calculates the average
+    surface albedo for each month across all years.
 
     CSV Download Instructions:
         1. Go to https://nsrdb.nrel.gov/data-viewer
@@ -36,27 +38,29 @@ def calculate_monthly_avg_albedo(folder_path):
         pd.DataFrame: A DataFrame containing the average surface albedo for each month across all years.
     """
     
-    # Initialize a list to store the DataFrames for each year
-    all_yearly_data = []
+    # Results are cached per folder, so repeated calls skip re-reading the CSV files
+    return _read_monthly_avg_albedo(str(folder_path)).copy()
 
-    # Loop through all files in the folder
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.csv'):
-            # Read each CSV file
-            file_path = os.path.join(folder_path, file_name)
-            df = pd.read_csv(file_path, skiprows=2)
-            
-            # Group by 'Year' and 'Month' and calculate the average 'Surface Albedo'
-            monthly_avg_albedo = df.groupby(['Year', 'Month'])['Surface Albedo'].mean().reset_index()
-            
-            # Append the DataFrame to the list
-            all_yearly_data.append(monthly_avg_albedo)
+@lru_cache(maxsize=32)
+def _read_monthly_avg_albedo(folder_path):
+    """
+    Cached implementation of calculate_monthly_avg_albedo, keyed on the folder path.
+    """
+    
+    # Read the needed columns of every CSV file in the folder with the multithreaded
+    # PyArrow reader, skipping the two rows of NSRDB site metadata
+    read_options = pacsv.ReadOptions(skip_rows=2)
+    convert_options = pacsv.ConvertOptions(include_columns=['Year', 'Month', 'Surface Albedo'])
+    all_yearly_data = [
+        pacsv.read_csv(file_path, read_options=read_options, convert_options=convert_options).to_pandas()
+        for file_path in glob.glob(os.path.join(folder_path, '*.csv'))
+    ]
     
     # Concatenate all the yearly data into a single DataFrame
-    combined_data = pd.concat(all_yearly_data)
+    combined_data = pd.concat(all_yearly_data, copy=False)
     
     # Group by 'Month' and calculate the average 'Surface Albedo' across all years
-    avg_monthly_albedo = combined_data.groupby('Month')['Surface Albedo'].mean().reset_index()
+    avg_monthly_albedo = combined_data.groupby('Month', sort=False, as_index=False)['Surface Albedo'].mean()
     
     # Return the resulting DataFrame
     return avg_monthly_albedo
@@ -1,8 +1,33 @@
+import os
 from datetime import datetime
+from functools import lru_cache
 import pandas as pd
 from meteostat import Daily, Point
 
+# Folder where fetched meteostat data is stored between runs
+_CACHE_DIR = '.cache'
+
+class _NoSnowData(Exception):
+    """Raised when meteostat returns no 'snow' data. Exceptions are not stored by lru_cache,
+    so the fetch is retried on the next call."""
+
 def calculate_new_row_height(lat, lon, row_height):
+    # The snowfall averages only depend on the location, so they are cached on the
+    # rounded coordinates and reused across row heights and repeated calls
+    try:
+        average_snowfall = _calculate_monthly_avg_snowfall(round(lat, 3), round(lon, 3)).copy()
+    except _NoSnowData:
+        print("No 'snow' data found.")
+        return pd.DataFrame(columns=['month', 'adjusted_row_height'])
+
+    # Calculate the adjusted row height
+    average_snowfall['adjusted_row_height'] = row_height - average_snowfall['average_snowfall']
+
+    # Return the new DataFrame with month and adjusted row height
+    return average_snowfall[['month', 'adjusted_row_height']]
+
+@lru_cache(maxsize=32)
+def _calculate_monthly_avg_snowfall(lat, lon):
     # Define the location
     location = Point(lat, lon)
 
@@ -10,9 +35,21 @@ def calculate_new_row_height(lat, lon, row_height):
     start = datetime(2019, 1, 1)
     end = datetime(2021, 12, 31)
 
-    # Get daily data
-    data = Daily(location, start, end)
-    data = data.fetch()
+    # Get daily data, reading it from the local parquet cache if this location was fetched before
+    cache_path = os.path.join(_CACHE_DIR, f"snow_{round(lat, 3)}_{round(lon, 3)}.parquet")
+    if os.path.exists(cache_path):
+        data = pd.read_parquet(cache_path)
+    else:
+        data = Daily(location, start, end)
+        data = data.fetch()
+
+        # A failed network or station lookup returns an empty DataFrame; don't cache it,
+        # so the fetch is retried on the next run
+        if data.empty or 'snow' not in data.columns:
+            raise _NoSnowData()
+
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        data.to_parquet(cache_path)
 
     # Ensure the index is a datetime index
     if not isinstance(data.index, pd.DatetimeIndex):
@@ -25,21 +62,13 @@ def calculate_new_row_height(lat, lon, row_height):
     data['snow'] = data['snow'].fillna(0)
 
     # Group by month and calculate the average snowfall (convert from mm to meters)
-    if 'snow' in data.columns:
-        average_snowfall = data.groupby('month')['snow'].mean().reset_index()
-        average_snowfall['average_snowfall'] = average_snowfall['snow'] / 1000
+    average_snowfall = data.groupby('month')['snow'].mean().reset_index()
+    average_snowfall['average_snowfall'] = average_snowfall['snow'] / 1000
 
-        # Drop the original 'snow' column to avoid confusion
-        average_snowfall = average_snowfall.drop(columns=['snow'])
+    # Drop the original 'snow' column to avoid confusion
+    average_snowfall = average_snowfall.drop(columns=['snow'])
 
-        # Rename columns for clarity
-        average_snowfall.columns = ['month', 'average_snowfall']
+    # Rename columns for clarity
+    average_snowfall.columns = ['month', 'average_snowfall']
 
-        # Calculate the adjusted row height
-        average_snowfall['adjusted_row_height'] = row_height - average_snowfall['average_snowfall']
-
-        # Return the new DataFrame with month and adjusted row height
-        return average_snowfall[['month', 'adjusted_row_height']]
-    else:
-        print("No 'snow' data found.")
-        return pd.DataFrame(columns=['month', 'adjusted_row_height'])
\ No newline at end of file
+    return average_snowfall
\ No newline at end of file
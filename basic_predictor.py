@@ -1,6 +1,8 @@
+import os
 import pandas as pd
 import numpy as np
 
+from joblib import Parallel, delayed
 from pvlib import pvsystem, location, modelchain
 from pvlib.temperature import TEMPERATURE_MODEL_PARAMETERS as PARAMS
 from pvlib.bifacial.pvfactors import pvfactors_timeseries
@@ -8,10 +10,174 @@ from pvlib.bifacial.pvfactors import pvfactors_timeseries
 from Albedo_TimeSeries.monthly_albedo import calculate_monthly_avg_albedo
 from SnowHeight.monthly_snow import calculate_new_row_height
 
+# Energy in kWh of one 20-minute sample of 1 W of AC power
+KWH_PER_SAMPLE_WATT = 1.0 / 3000.0
+
+# Simulate the periods in worker processes on every CPU; on a single CPU the process startup
+# and pickling costs outweigh any gain, so they run sequentially instead
+DEFAULT_N_JOBS = -1 if (os.cpu_count() or 1) > 1 else 1
+
+def monthly_lookup(df, month_col, value_col, default):
+    """
+    Build an array of monthly values that can be indexed directly by month number.
+
+    Parameters:
+    - df: DataFrame containing one row per month.
+    - month_col: Name of the column holding the month number (1-12).
+    - value_col: Name of the column holding the value for that month.
+    - default: Value used for months missing from df.
+
+    Returns:
+    - lookup: Array of length 13 where lookup[month] is the value for that month.
+    """
+    lookup = np.full(13, float(default), dtype=np.float64)
+    lookup[df[month_col].to_numpy().astype(int)] = df[value_col].to_numpy()
+    return lookup
+
+def infer_system_models(system, site_location):
+    """
+    Infer the cell temperature, DC and AC models for a PVSystem the same way ModelChain does.
+
+    Parameters:
+    - system: PVSystem containing the module, inverter and temperature model parameters.
+    - site_location: pvlib Location object for the site.
+
+    Returns:
+    - models: Tuple of (temperature_model, dc_model, ac_model) names, as used by
+      simulate_window.
+
+    A ModelChain is built once only to run its inference and parameter validation, so
+    unsupported parameters raise a ValueError here rather than inside a simulation worker.
+    """
+    mc = modelchain.ModelChain(system, site_location, aoi_model='no_loss')
+    temperature_model = mc.temperature_model.__name__[:-len('_temp')]  # e.g. sapm_temp -> sapm
+    dc_model = mc.dc_model.__name__  # sapm, desoto, cec, pvsyst or pvwatts_dc
+    ac_model = mc.ac_model.__name__[:-len('_inverter')]  # e.g. sandia_inverter -> sandia
+    return temperature_model, dc_model, ac_model
+
+def precompute_window_conditions(date_list, tz, site_location, albedo_by_month):
+    """
+    Calculate the time index, solar position, clear sky irradiance and albedo for each simulated
+    day. These only depend on the site, so they can be reused for every tracker configuration.
+
+    Parameters:
+    - date_list: Start dates of the 10-day periods being simulated.
+    - tz: Timezone of the site.
+    - site_location: pvlib Location object for the site.
+    - albedo_by_month: Array of surface albedo values indexed by month.
+
+    Returns:
+    - conditions: Dictionary mapping each start date to a tuple of
+      (solar_position, cs, times, albedo_values) for that simulated day.
+    """
+    # Build the time index of every simulated day and evaluate the solar position and
+    # clear sky irradiance for all of them in a single call
+    window_times = [
+        pd.date_range(start_date, start_date + pd.Timedelta(days=1), freq='20min', tz=tz)
+        for start_date in date_list
+    ]
+    times_all = window_times[0].append(window_times[1:])
+    solar_position_all = site_location.get_solarposition(times_all)  # Get the solar position for every simulated day
+    cs_all = site_location.get_clearsky(times_all)  # Get the clear sky irradiance data
+    albedo_all = np.take(albedo_by_month, times_all.month.to_numpy())  # Get albedo values for every simulated day
+
+    # Split the results back into one slice per simulated day
+    bounds = np.cumsum([0] + [len(times) for times in window_times])
+    conditions = {}
+    for start_date, times, lo, hi in zip(date_list, window_times, bounds[:-1], bounds[1:]):
+        solar_position = solar_position_all.iloc[lo:hi]
+        cs = cs_all.iloc[lo:hi]
+        albedo_values = pd.Series(albedo_all[lo:hi], index=times, name='albedo')
+        conditions[start_date] = (solar_position, cs, times, albedo_values)
+    return conditions
+
+def simulate_window(
+        solar_position, cs, times, albedo_values, sat_mount, system, models, pvrow_height,
+        gcr, pvrow_width, bifaciality, n_pvrows):
+    """
+    Simulate the energy output of a bifacial single-axis tracker system for a single day,
+    which represents one 10-day period of the year.
+
+    Parameters:
+    - solar_position, cs, times, albedo_values: Site conditions for the simulated day, as
+      returned by precompute_window_conditions.
+    - sat_mount: Single-axis tracker mount configuration.
+    - system: PVSystem containing the module and inverter parameters.
+    - models: Temperature, DC and AC model names, as returned by infer_system_models.
+    - pvrow_height: Height of the PV rows for this period.
+    - gcr: Ground coverage ratio.
+    - pvrow_width: Width of the PV rows.
+    - bifaciality: Bifaciality factor of the solar panels.
+    - n_pvrows: Number of PV rows in the pvfactors model.
+
+    Returns:
+    - energy_kwh: Energy output of the simulated day in kWh.
+
+    The temperature, DC and AC models are evaluated directly on the PVSystem, following the
+    same steps as ModelChain.run_model_from_effective_irradiance. No state is stored on the
+    shared mount or system, so windows can be simulated independently.
+    """
+    # Calculate the panel orientation based on solar position and mount configuration
+    orientation = sat_mount.get_orientation(solar_position['apparent_zenith'],
+                                            solar_position['azimuth'])
+
+    # Calculate the irradiance using the pvfactors model
+    irrad = pvfactors_timeseries(solar_position['azimuth'],
+                                 solar_position['apparent_zenith'],
+                                 orientation['surface_azimuth'],
+                                 orientation['surface_tilt'],
+                                 180,  # Fixed axis_azimuth
+                                 times,
+                                 cs['dni'],
+                                 cs['dhi'],
+                                 gcr,
+                                 pvrow_height,
+                                 pvrow_width,
+                                 albedo_values,
+                                 n_pvrows=n_pvrows,
+                                 index_observed_pvrow=1)
+
+    # pvfactors returns the incident and absorbed irradiance on the front and back surfaces;
+    # calculate the effective irradiance from the absorbed values considering bifaciality
+    _, _, total_abs_front, total_abs_back = irrad
+    effective_irradiance = pd.Series(
+        np.add(total_abs_front.to_numpy(), total_abs_back.to_numpy() * bifaciality), index=times
+    )
+
+    temperature_model, dc_model, ac_model = models
+
+    # Calculate the cell temperature from the effective irradiance, using the default
+    # weather of 20 C air temperature and no wind
+    temperature_kwargs = {}
+    if temperature_model == 'noct_sam':
+        temperature_kwargs['effective_irradiance'] = effective_irradiance
+    cell_temperature = system.get_cell_temperature(effective_irradiance, temp_air=20, wind_speed=0,
+                                                   model=temperature_model, **temperature_kwargs)
+
+    # Calculate the DC output
+    if dc_model == 'sapm':
+        dc = system.scale_voltage_current_power(system.sapm(effective_irradiance, cell_temperature))
+    elif dc_model == 'pvwatts_dc':
+        dc = pd.DataFrame({'p_mp': system.pvwatts_dc(effective_irradiance, cell_temperature)})
+        dc = system.scale_voltage_current_power(dc)
+    else:
+        # Single diode models (desoto, cec, pvsyst)
+        diode_params = getattr(system, 'calcparams_' + dc_model)(effective_irradiance, cell_temperature)
+        dc = system.singlediode(*diode_params)
+        dc = system.scale_voltage_current_power(dc).fillna(0)
+
+    # Calculate the AC output
+    if ac_model == 'pvwatts':
+        ac_power = system.get_ac('pvwatts', dc['p_mp']).fillna(0)
+    else:
+        ac_power = system.get_ac(ac_model, dc['p_mp'], v_dc=dc['v_mp'])
+    ac_power = ac_power.to_numpy()  # Get the AC power output
+    return float(np.nansum(ac_power)) * KWH_PER_SAMPLE_WATT  # Convert from watts to kWh, skipping missing values
+
 def calculate_total_energy(
         height, ext_or_int, opt_tilt, albedodata_filepath, lat, lon, tz, gcr, 
         max_angle, pvrow_width, bifaciality, temp_model_parameters, cec_modules, cec_module,
-        cec_inverters, cec_inverter, site_name):
+        cec_inverters, cec_inverter, site_name, n_jobs=DEFAULT_N_JOBS):
     """
     Calculate the total energy output of a solar farm over a year, considering different parameters
     such as albedo, snow height, and bifacial gain.
@@ -30,6 +196,8 @@ def calculate_total_energy(
     - cec_modules, cec_module: Module data for the system.
     - cec_inverters, cec_inverter: Inverter data for the system.
     - site_name: Name of the site.
+    - n_jobs: Number of worker processes used to simulate the periods. Defaults to every CPU
+      (-1), or sequential (1) on a single-CPU machine.
 
     Returns:
     - total_energy_bi: Total energy output of the bifacial solar system in kWh over the year.
@@ -47,95 +215,45 @@ def calculate_total_energy(
     else:
         raise ValueError("Invalid value for ext_or_int. Must be 'Ext' or 'Int'.")
 
-    # Load the albedo data
+    # Load the albedo data into a lookup array indexed by month (default albedo of 0.2)
     albedo_data = calculate_monthly_avg_albedo(albedodata_filepath)
-    
-    def get_albedo(date):
-        # Get the albedo value based on the month
-        month = date.month
-        albedo_row = albedo_data[albedo_data['Month'] == month]
-        if not albedo_row.empty:
-            return albedo_row['Surface Albedo'].values[0]
-        else:
-            return 0.2  # Default albedo value if no data is available
+    albedo_by_month = monthly_lookup(albedo_data, 'Month', 'Surface Albedo', 0.2)
     
     # Create a location object for the site
     site_location = location.Location(lat, lon, tz=tz, name=site_name)
     
-    # Calculate adjusted row heights based on snow conditions
+    # Calculate adjusted row heights based on snow conditions, indexed by month
+    # (defaults to the original reveal height if no adjustment is needed)
     adjusted_heights_df = calculate_new_row_height(lat, lon, height)
-        
-    def get_adjusted_row_height(date):
-        # Get the adjusted row height based on the month and snow data
-        month = date.month
-        height_row = adjusted_heights_df[adjusted_heights_df['month'] == month]
-        if not height_row.empty:
-            return height_row['adjusted_row_height'].values[0]
-        else:
-            return height  # Default to original reveal height if no adjustment is needed
-    
-    total_energy_bi = 0  # Initialize total energy accumulator
-    start_date = pd.Timestamp('2021-01-01')  # Start date of the simulation
-    end_date = pd.Timestamp('2021-12-31')  # End date of the simulation
-    count = 0  # Initialize the counter for iterations
-
-    # Loop through the entire year with 10-day increments
-    while start_date <= end_date:
-        times = pd.date_range(start_date, start_date + pd.Timedelta(days=1), freq='20min', tz=tz)
-        albedo_values = times.to_series().apply(get_albedo)  # Get albedo values for the current time range
-        pvrow_height = get_adjusted_row_height(start_date)  # Adjust the row height for the current date
-        solar_position = site_location.get_solarposition(times)  # Get the solar position for the current time range
-        cs = site_location.get_clearsky(times)  # Get the clear sky irradiance data
-        
-        # Define the single-axis tracker mount configuration
-        sat_mount = pvsystem.SingleAxisTrackerMount(axis_tilt=opt_tilt,
-                                                    axis_azimuth=180,
-                                                    max_angle=max_angle,
-                                                    backtrack=True,
-                                                    gcr=gcr)
-        # Calculate the panel orientation based on solar position and mount configuration
-        orientation = sat_mount.get_orientation(solar_position['apparent_zenith'],
-                                                solar_position['azimuth'])
-
-        # Calculate the irradiance using the pvfactors model
-        irrad = pvfactors_timeseries(solar_position['azimuth'],
-                                     solar_position['apparent_zenith'],
-                                     orientation['surface_azimuth'],
-                                     orientation['surface_tilt'],
-                                     180,  # Fixed axis_azimuth
-                                     times,
-                                     cs['dni'],
-                                     cs['dhi'],
-                                     gcr,
-                                     pvrow_height,
-                                     pvrow_width,
-                                     albedo_values,
-                                     n_pvrows=n_pvrows,
-                                     index_observed_pvrow=1)
-
-        irrad = pd.concat(irrad, axis=1)
-        irrad['effective_irradiance'] = (
-            irrad['total_abs_front'] + (irrad['total_abs_back'] * bifaciality)
-        )
-
-        # Define the PV array and system configuration
-        array = pvsystem.Array(mount=sat_mount,
-                               module_parameters=cec_module,
-                               temperature_model_parameters=temp_model_parameters)
-        system = pvsystem.PVSystem(arrays=[array],
-                                   inverter_parameters=cec_inverter)
-        
-        # Run the ModelChain simulation
-        mc_bifi = modelchain.ModelChain(system, site_location, aoi_model='no_loss')
-        mc_bifi.run_model_from_effective_irradiance(irrad)
-
-        ac_power = mc_bifi.results.ac  # Get the AC power output
-        energy_kwh = ac_power.sum() / 3000  # Convert from watts to kWh
-        total_energy_bi += energy_kwh  # Accumulate total energy
-
-        start_date += pd.Timedelta(days=10)  # Move to the next 10-day period
-        count += 1  # Increment the counter
+    height_by_month = monthly_lookup(adjusted_heights_df, 'month', 'adjusted_row_height', height)
 
-    # Calculate the average total energy over the year, scaling up by the number of periods
-    return total_energy_bi * (365 / count)
+    # Define the single-axis tracker mount configuration
+    sat_mount = pvsystem.SingleAxisTrackerMount(axis_tilt=opt_tilt,
+                                                axis_azimuth=180,
+                                                max_angle=max_angle,
+                                                backtrack=True,
+                                                gcr=gcr)
 
+    # Define the PV array and system configuration once; they are shared by every
+    # simulation period
+    array = pvsystem.Array(mount=sat_mount,
+                           module_parameters=cec_module,
+                           temperature_model_parameters=temp_model_parameters)
+    system = pvsystem.PVSystem(arrays=[array],
+                               inverter_parameters=cec_inverter)
+    models = infer_system_models(system, site_location)
+
+    # Simulate one day every 10 days through the year; the periods are independent, so
+    # they can be spread over worker processes (pvfactors holds the GIL, so threads don't help)
+    date_list = pd.date_range('2021-01-01', '2021-12-31', freq='10D')
+    conditions = precompute_window_conditions(date_list, tz, site_location, albedo_by_month)
+    energies = Parallel(n_jobs=n_jobs, prefer='processes')(
+        delayed(simulate_window)(*conditions[start_date], sat_mount, system, models,
+                                 height_by_month[start_date.month],
+                                 gcr, pvrow_width, bifaciality, n_pvrows)
+        for start_date in date_list
+    )
+    total_energy_bi = sum(energies)  # Accumulate total energy
+
+    # Calculate the average total energy over the year, scaling up by the number of periods
+    return total_energy_bi * (365 / len(date_list))
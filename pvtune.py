@@ -19,54 +19,61 @@ def process_pvtune_output(file_path):
     - weighted_average_reveal_height: the average pv row height across all modules
     '''
     
-    # Load the CSV file into a DataFrame
-    df = pd.read_csv(file_path, usecols=range(23))
+    # Load the columns used below from the CSV file into a DataFrame. The pandas C parser is used
+    # because, unlike the PyArrow reader, it tolerates the extra trailing fields of PVTune exports;
+    # index_col=False keeps those fields from shifting the columns onto an implicit index
+    df = pd.read_csv(
+        file_path,
+        index_col=False,
+        usecols=['Description', 'Tracker Row Id', 'N', 'Reveal Height', 'E', 'Z (Existing Grade)'],
+        dtype={'Tracker Row Id': np.int32, 'N': np.float64, 'Reveal Height': np.float64}
+    )
 
     # Filter the DataFrame to only include rows where Description is "Ext_Array_END" or "Int_Array_END"
     array_end_df = df[(df['Description'] == 'Ext_Array_END') | (df['Description'] == 'Int_Array_END')]
 
-    # Group by 'Tracker Row Id' and calculate the absolute difference in 'N' values
-    abs_diff_n = array_end_df.groupby('Tracker Row Id')['N'].apply(lambda x: abs(x.iloc[0] - x.iloc[1]) if len(x) > 1 else None)
+    # Group by 'Tracker Row Id' and calculate the absolute difference in 'N' values between
+    # the two array ends (rows with a single end have no difference)
+    grouped_n = array_end_df.groupby('Tracker Row Id')['N']
+    abs_diff_n = (grouped_n.first() - grouped_n.last()).abs().where(grouped_n.size() > 1)
 
     # Map the calculated differences to the original DataFrame
     df['Difference in N'] = df['Tracker Row Id'].map(abs_diff_n)
 
     # Create a new column "Number of Modules" based on the conditions
-    df['Number of Modules'] = df['Difference in N'].apply(
-        lambda x: 78 if 250 < x < 270 else (104 if 380 < x < 400 else None)
-    )
-
-    # Move "Number of Modules" to be the first column
-    cols = df.columns.tolist()
-    cols.insert(0, cols.pop(cols.index('Number of Modules')))
-    df = df[cols]
-
-    # Calculate the maximum "Reveal Height" for each "Tracker Row Id"
-    max_reveal_height = df.groupby('Tracker Row Id')['Reveal Height'].transform('max')
-
-    # Round up the "Max Reveal Height" to the nearest quarter foot
-    rounded_reveal_height = 0.75 + (np.ceil(max_reveal_height * 4) / 4)
-
-    # Add this rounded value back into the DataFrame
-    df['Max Reveal Height'] = rounded_reveal_height
-
-    # Move "Max Reveal Height" to be the first column
-    cols = df.columns.tolist()
-    cols.insert(0, cols.pop(cols.index('Max Reveal Height')))
-    df = df[cols]
-
-    # Sort the DataFrame by "Tracker Row Id" in increasing order
-    df = df.sort_values(by='Tracker Row Id', ascending=True)
-
-    # Aggregate data to create the new DataFrame
-    new_df = df.groupby('Tracker Row Id').agg({
-        'Max Reveal Height': 'max',
-        'Number of Modules': 'first',  # Assuming the first non-null value is what you want to retain
-        'E': 'first',  # Take the first value, assuming E is consistent per Tracker Row Id
-        'Z (Existing Grade)': 'first',  # Take the first value
-        'Description': lambda x: 'Ext' if x.str.contains('Ext').any() else 'Int'  # Determine if any "Ext" or "Int" exists
+    diff_n = df['Difference in N'].to_numpy()
+    num_modules = np.where((diff_n > 250) & (diff_n < 270), 78,
+                           np.where((diff_n > 380) & (diff_n < 400), 104, np.nan))
+
+    # Keep the module counts as integers unless some rows could not be classified
+    if not np.isnan(num_modules).any():
+        num_modules = num_modules.astype(np.int64)
+    df['Number of Modules'] = num_modules
+
+    # Flag the rows whose description marks them as external
+    df['Is Ext'] = df['Description'].str.contains('Ext', regex=False)
+
+    # Aggregate data to create the new DataFrame in a single pass over each "Tracker Row Id"
+    new_df = df.groupby('Tracker Row Id', sort=False).agg(**{
+        'Max Reveal Height': ('Reveal Height', 'max'),
+        'Number of Modules': ('Number of Modules', 'first'),  # Assuming the first non-null value is what you want to retain
+        'E': ('E', 'first'),  # Take the first value, assuming E is consistent per Tracker Row Id
+        'Z (Existing Grade)': ('Z (Existing Grade)', 'first'),  # Take the first value
+        'Is Ext': ('Is Ext', 'any')  # Determine if any "Ext" or "Int" exists
     }).reset_index()
 
+    # Round up the "Max Reveal Height" to the nearest quarter foot and add 0.75, working in
+    # place on a single array
+    rounded_reveal_height = new_df['Max Reveal Height'].to_numpy(dtype=np.float64, copy=True)
+    rounded_reveal_height *= 4
+    np.ceil(rounded_reveal_height, out=rounded_reveal_height)
+    rounded_reveal_height *= 0.25
+    rounded_reveal_height += 0.75
+    new_df['Max Reveal Height'] = rounded_reveal_height
+
+    # Label each tracker row as external or internal
+    new_df['Description'] = np.where(new_df.pop('Is Ext'), 'Ext', 'Int')
+
     # Group by 'Max Reveal Height' and 'Description', then aggregate the number of rows and total number of modules
     summary_df = new_df.groupby(['Max Reveal Height', 'Description']).agg(
         Number_of_Rows=('Tracker Row Id', 'count'),